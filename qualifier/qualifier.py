@@ -1,11 +1,19 @@
+import os
+import shutil
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 from math import prod
+from pathlib import Path
 
 import cv2
 import numpy as np
+from numpy.typing import DTypeLike
+from PIL import Image
 
 
 def valid_input(
-    image_size: tuple[int, int], tile_size: tuple[int, int], ordering: list[int]
+    image_size: tuple[int, int], tile_size: tuple[int, int], ordering: Sequence[int] | np.ndarray
 ) -> bool:
     """
     Return True if the given input allows the rearrangement of the image, False otherwise.
@@ -15,8 +23,149 @@ def valid_input(
     """
 
     tiles, remainder = divmod(prod(image_size), prod(tile_size))
+    if remainder or len(ordering) != tiles:
+        return False
 
-    return (remainder == 0 and sorted(ordering) == list(range(tiles))) or False
+    if tiles > 64:
+        # Count in C rather than walking the Python ints one by one
+        try:
+            ordering_arr = np.asarray(ordering)
+        except (OverflowError, ValueError, TypeError):
+            return False
+        # Casting straight to intp would truncate floats and parse numeric strings, entries too large for it end up as
+        # an object array
+        if ordering_arr.ndim != 1 or not np.issubdtype(ordering_arr.dtype, np.integer):
+            return False
+        if ordering_arr.min() < 0 or ordering_arr.max() >= tiles:
+            return False
+        return bool(np.bincount(ordering_arr.astype(np.intp, copy=False), minlength=tiles).max() == 1)
+
+    # Single pass over `ordering`, bailing out on the first non-integer, out of range or repeated tile
+    seen = bytearray(tiles)
+    for tile in ordering:
+        if not np.issubdtype(type(tile), np.integer) or not 0 <= tile < tiles or seen[tile]:
+            return False
+        seen[tile] = 1
+
+    return True
+
+
+def _segment_lut(rows: int, cols: int, tile_height: int, ordering: np.ndarray) -> np.ndarray:
+    """
+    Return the index of the source segment for every output segment, see `_permute_tiles`.
+
+    When `ordering` only moves whole rows of tiles around, the segments are full pixel rows of the image instead.
+    """
+
+    src_rows, src_cols = (a.reshape(rows, cols) for a in np.divmod(ordering, cols))
+    tile_rows = np.arange(tile_height).reshape(1, tile_height, 1)
+
+    if (src_cols == np.arange(cols)).all() and (src_rows == src_rows[:, :1]).all():
+        # Laid out as (rows, tile_height)
+        return (src_rows[:, :1, np.newaxis] * tile_height + tile_rows).ravel()
+
+    # Laid out as (rows, tile_height, cols), the order of the segments in the image
+    return ((src_rows[:, np.newaxis] * tile_height + tile_rows) * cols + src_cols[:, np.newaxis]).ravel()
+
+
+def _take_segments(lut: np.ndarray, img: np.ndarray, out: np.ndarray) -> None:
+    """Copy the segments of `img` into `out` as indexed by `lut`, see `_permute_tiles`."""
+
+    # The LUT is always in range, and with the default `mode="raise"` NumPy buffers the whole output in a temporary
+    np.take(img.reshape(lut.size, -1), lut, axis=0, out=out.reshape(lut.size, -1), mode="clip")
+
+
+def _build_kernel(
+    rows: int, cols: int, tile_height: int, ordering: np.ndarray
+) -> Callable[[np.ndarray, np.ndarray], None]:
+    """
+    Return a function writing the tiles of its first argument into the second, specialized for the given tiling.
+
+    All the index math is done here once, so batches of images sharing a tiling only pay for the copy itself.
+    """
+
+    lut = _segment_lut(rows, cols, tile_height, ordering)
+    lut.flags.writeable = False  # Shared between callers
+
+    # Not a closure, so that it can be pickled over to worker processes
+    return partial(_take_segments, lut)
+
+
+@lru_cache(maxsize=32)
+def _make_kernel(
+    rows: int, cols: int, tile_height: int, ordering: tuple[int, ...]
+) -> Callable[[np.ndarray, np.ndarray], None]:
+    """Cached `_build_kernel`, for callers holding `ordering` as a plain sequence."""
+
+    return _build_kernel(rows, cols, tile_height, np.asarray(ordering, dtype=np.intp))
+
+
+def _permute_tiles(
+    img: np.ndarray, out: np.ndarray, ordering: list[int], rows: int, cols: int, tile_height: int
+) -> None:
+    """
+    Write the tiles of `img` into `out` in the order given by `ordering`.
+
+    Both images are viewed as a stack of "segments", one per tile per pixel row, each being a contiguous span of
+    `tile_width * channels` bytes in a C-contiguous image. The permutation then boils down to a single `np.take` of
+    those segments, copying each one straight into its final place in `out` without any temporaries. The segments
+    grow to whole pixel rows when the ordering allows for it.
+    """
+
+    _make_kernel(rows, cols, tile_height, tuple(ordering))(img, out)
+
+
+def _decode_image(buf: bytes) -> np.ndarray:
+    """Decode an encoded image, keeping its channels (and alpha) as is."""
+
+    return cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+def _write_image(out_path: str, img: np.ndarray) -> None:
+    """Encode `img` to `out_path`, the format being picked from its suffix."""
+
+    # OpenCV's defaults are already tuned for speed (PNG: level 1 with Z_RLE), explicit flags only slow it down
+    cv2.imwrite(out_path, img)
+
+
+def _image_size(image_path: str) -> tuple[int, int] | None:
+    """
+    Return the (height, width) of an image, reading only its header.
+
+    Return None for the formats that Pillow doesn't know of but OpenCV does (e.g. Radiance `.hdr`).
+    """
+
+    try:
+        with Image.open(image_path) as img:
+            return img.height, img.width
+    except OSError:  # `PIL.UnidentifiedImageError` included
+        return None
+
+
+def _is_identity(ordering: list[int] | np.ndarray) -> bool:
+    """Return True if `ordering` leaves every tile where it is."""
+
+    if isinstance(ordering, np.ndarray):
+        return bool((ordering == np.arange(ordering.size)).all())
+    return all(i == tile for i, tile in enumerate(ordering))
+
+
+def _copy_image(image_path: str, out_path: str) -> bool:
+    """
+    Copy the image file over as is, for orderings leaving every tile in place.
+
+    Return False, without copying, if the output is meant to be in another format than the input.
+    """
+
+    if Path(image_path).suffix.lower() != Path(out_path).suffix.lower():
+        return False
+
+    try:
+        shutil.copyfile(image_path, out_path)
+    except shutil.SameFileError:
+        pass
+
+    return True
 
 
 def rearrange_tiles(
@@ -39,37 +188,165 @@ def rearrange_tiles(
     - https://realpython.com/image-processing-with-the-python-pillow-library
     """
 
-    img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+    if _is_identity(ordering):
+        # Nothing to move, spare the decode and encode when the file can be copied as is
+        image_size = _image_size(image_path)
+        if image_size is not None:
+            if not valid_input(image_size, tile_size, ordering):
+                raise ValueError("The tile size or ordering are not valid for the given image")
+            if _copy_image(image_path, out_path):
+                return
+
+    with open(image_path, "rb") as f:
+        rearrange_tiles_bytes(f.read(), tile_size, ordering, out_path)
+
+
+def rearrange_tiles_bytes(buf: bytes, tile_size: tuple[int, int], ordering: list[int], out_path: str) -> None:
+    """
+    Same as `rearrange_tiles`, but for an already read encoded image.
+
+    Keeping the file read apart from the decode lets callers overlap I/O with the CPU bound work.
+    """
+
+    img = _decode_image(buf)
     if not valid_input(img.shape[:2], tile_size, ordering):
         raise ValueError("The tile size or ordering are not valid for the given image")
 
-    img_height, img_width, channels = img.shape
+    img_height, img_width = img.shape[:2]
     tile_height, tile_width = tile_size
 
     rows = img_height // tile_height
     cols = img_width // tile_width
 
-    # Having these seperated for self documentation purposes
-    unordered_tiles = img.reshape(
-        rows,
-        tile_height,
-        cols,
-        tile_width,
-        channels,
-    ).swapaxes(1, 2)
-
-    # `unordered_tiles[n, m]` here returns a view of shape (tiles, tile_height, tile_width, channels)
-    ordered_tiles = unordered_tiles[*np.divmod(ordering, cols)].reshape(
-        rows,
-        cols,
-        tile_height,
-        tile_width,
-        channels,
-    )
+    unscrambled_img = np.empty_like(img)
+    _permute_tiles(img, unscrambled_img, ordering, rows, cols, tile_height)
+
+    _write_image(out_path, unscrambled_img)
+
+
+def rearrange_tiles_raw(
+    image_path: str,
+    shape: tuple[int, ...],
+    dtype: DTypeLike,
+    tile_size: tuple[int, int],
+    ordering: list[int],
+    out_path: str,
+) -> None:
+    """
+    Same as `rearrange_tiles`, but for raw, already decoded pixel data of the given `shape` and `dtype`.
+
+    Both files are memory mapped, so the pages are read and written by the OS as the tiles are copied, without ever
+    holding the whole image in memory. The only allocation is the lookup table of `_permute_tiles`, one index per tile
+    per pixel row, which is dropped once done rather than cached. The output can't overwrite the input in place.
+    """
+
+    img_height, img_width = shape[0], shape[1]
+    if not valid_input((img_height, img_width), tile_size, ordering):
+        raise ValueError("The tile size or ordering are not valid for the given image")
+    # Opening the output would truncate the input before it is read
+    if os.path.exists(out_path) and os.path.samefile(image_path, out_path):
+        raise ValueError("The output path must differ from the image path")
+
+    tile_height, tile_width = tile_size
+
+    rows = img_height // tile_height
+    cols = img_width // tile_width
+
+    img = np.memmap(image_path, dtype=dtype, mode="r", shape=shape)
+    unscrambled_img = np.memmap(out_path, dtype=dtype, mode="w+", shape=shape)
+    _build_kernel(rows, cols, tile_height, np.asarray(ordering, dtype=np.intp))(img, unscrambled_img)
+
+    unscrambled_img.flush()
+
+
+class TileRearranger:
+    """
+    Rearrange images of a fixed `image_size` by a fixed `tile_size` and `ordering`.
+
+    The input is validated and the permutation kernel built once, up front, rather than on every image. `ordering`
+    may be given as an integer array, sparing its conversion from Python ints altogether. The output
+    buffer is kept around and reused between calls too, which makes an instance unsafe to share between threads.
+    Instances are picklable (without the buffer), so they can be handed to worker processes as is.
+    """
+
+    def __init__(
+        self, tile_size: tuple[int, int], ordering: list[int] | np.ndarray, image_size: tuple[int, int]
+    ) -> None:
+        if not valid_input(image_size, tile_size, ordering):
+            raise ValueError("The tile size or ordering are not valid for the given image")
+        # Only safe once validated, the cast would truncate floats or overflow on huge ints
+        ordering = np.asarray(ordering, dtype=np.intp)
+
+        self.image_size = tuple(image_size)
+        self.identity = _is_identity(ordering)
+
+        tile_height, tile_width = tile_size
+        self.kernel = _build_kernel(image_size[0] // tile_height, image_size[1] // tile_width, tile_height, ordering)
+
+        self._out: np.ndarray | None = None
+
+    def __getstate__(self) -> dict:
+        return self.__dict__ | {"_out": None}
+
+    def __call__(self, image_path: str, out_path: str) -> None:
+        image_size = _image_size(image_path) if self.identity else None
+        if image_size is not None:
+            if image_size != self.image_size:
+                raise ValueError("The tile size or ordering are not valid for the given image")
+            if _copy_image(image_path, out_path):
+                return
+
+        with open(image_path, "rb") as f:
+            img = _decode_image(f.read())
+        if img.shape[:2] != self.image_size:
+            raise ValueError("The tile size or ordering are not valid for the given image")
+
+        # Images may still differ in their channels
+        if self._out is None or self._out.shape != img.shape or self._out.dtype != img.dtype:
+            self._out = np.empty_like(img)
+        self.kernel(img, self._out)
+
+        _write_image(out_path, self._out)
+
+
+# The `TileRearranger` of a `rearrange_tiles_batch` worker process
+_worker_rearranger: TileRearranger | None = None
+
+
+def _init_worker(rearranger: TileRearranger) -> None:
+    global _worker_rearranger
+
+    # The pool already runs a process per core, OpenCV's own threads would only oversubscribe them
+    cv2.setNumThreads(1)
+    _worker_rearranger = rearranger
+
+
+def _run_worker(image_path: str, out_path: str) -> None:
+    assert _worker_rearranger is not None, "Only meant to run in workers set up by `_init_worker`"
+    _worker_rearranger(image_path, out_path)
+
+
+def rearrange_tiles_batch(
+    image_paths: Iterable[str],
+    image_size: tuple[int, int],
+    tile_size: tuple[int, int],
+    ordering: list[int] | np.ndarray,
+    out_paths: Iterable[str],
+    max_workers: int | None = None,
+) -> None:
+    """
+    Rearrange many images of the same `image_size`, sharing the same `tile_size` and `ordering`.
+
+    The images are spread over a process pool. Each worker is handed the `TileRearranger` once, when starting, and
+    keeps reusing it along with its output buffer for every image it gets.
+    """
 
-    unscrambled_img = ordered_tiles.swapaxes(1, 2).reshape(img.shape)
+    rearranger = TileRearranger(tile_size, ordering, image_size)
 
-    cv2.imwrite(out_path, unscrambled_img)
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(rearranger,)) as executor:
+        # Drain the iterator so that exceptions from the workers are raised here
+        for _ in executor.map(_run_worker, image_paths, out_paths, chunksize=8):
+            pass
 
 
 if __name__ == "__main__":
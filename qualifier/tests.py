@@ -1,7 +1,11 @@
 from dataclasses import dataclass
+import filecmp
+import os
+import tempfile
 import unittest
 import unittest.mock
 
+import cv2
 import numpy as np
 from PIL import Image
 
@@ -53,6 +57,25 @@ class ValidInputTest(unittest.TestCase):
         ordering[-1] -= 1
         self.assertFalse(qualifier.valid_input(self.images[0].image_size, (256, 256), ordering))
 
+    def test_non_integer_ordering(self):
+        """Orderings with entries that aren't integers, even if they look like them, are not valid."""
+        for image in self.images[:2]:  # Both the bytearray and the NumPy checks
+            for convert in (float, lambda tile: tile + 0.5, str):
+                with self.subTest(image=image.scrambled_image_path, convert=convert):
+                    ordering = [convert(tile) for tile in image.ordering]
+                    self.assertFalse(qualifier.valid_input(image.image_size, image.tile_size, ordering))
+
+    def test_invalid_ordering_many_tiles(self):
+        """Give orderings that aren't permutations for a grid large enough to be checked with NumPy."""
+        image = self.images[1]
+        # Values replacing the last tile of the ordering
+        test_cases = [image.ordering[0], -1, len(image.ordering), 2**70]
+        for last_tile in test_cases:
+            with self.subTest(last_tile=last_tile):
+                ordering = image.ordering.copy()
+                ordering[-1] = last_tile
+                self.assertFalse(qualifier.valid_input(image.image_size, image.tile_size, ordering))
+
     def test_tile_size_doesnt_match_ordering(self):
         """Should not be valid if the length of `ordering` is not the number of tiles."""
         ordering = self.images[0].ordering.copy()
@@ -112,7 +135,146 @@ class ValidInputTest(unittest.TestCase):
                 user_output = np.array(Image.open("images/user_output.png"))
 
                 self.assertTrue((user_output == correct_output).all())
-    
+
+    def test_identity_ordering(self):
+        """An ordering leaving every tile in place should give back the input image."""
+        image = self.images[0]
+        rows, cols = (i // t for i, t in zip(image.image_size, image.tile_size))
+        with tempfile.TemporaryDirectory() as out_dir:
+            # Same format as the input, then a different one which has to go through the encoder
+            for out_path in (os.path.join(out_dir, "user_output.png"), os.path.join(out_dir, "user_output.tiff")):
+                with self.subTest(out_path=out_path):
+                    qualifier.rearrange_tiles(
+                        image.unscrambled_image_path, image.tile_size, list(range(rows * cols)), out_path
+                    )
+
+                    correct_output = np.array(Image.open(image.unscrambled_image_path))
+                    user_output = np.array(Image.open(out_path))
+
+                    self.assertTrue((user_output == correct_output).all())
+
+            # The file should have been copied over rather than encoded again
+            self.assertTrue(filecmp.cmp(image.unscrambled_image_path, os.path.join(out_dir, "user_output.png"), False))
+
+    def test_identity_ordering_unknown_to_pillow(self):
+        """Images only OpenCV can read should still go through with an ordering leaving every tile in place."""
+        img = np.random.default_rng(0).random((16, 16, 3), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as out_dir:
+            image_path, out_path = os.path.join(out_dir, "image.hdr"), os.path.join(out_dir, "user_output.hdr")
+            cv2.imwrite(image_path, img)
+
+            qualifier.rearrange_tiles(image_path, (8, 8), [0, 1, 2, 3], out_path)
+
+            correct_output = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+            user_output = cv2.imread(out_path, cv2.IMREAD_UNCHANGED)
+
+        self.assertTrue((user_output == correct_output).all())
+
+    def test_raw_correct_ordering(self):
+        """Unscramble raw pixel data dumped from the images."""
+        for image_index in range(len(self.images)):
+            with self.subTest(image_index=image_index):
+                image = self.images[image_index]
+                scrambled = np.array(Image.open(image.scrambled_image_path))
+                correct_output = np.array(Image.open(image.unscrambled_image_path))
+
+                with tempfile.TemporaryDirectory() as out_dir:
+                    image_path, out_path = os.path.join(out_dir, "scrambled.bin"), os.path.join(out_dir, "user.bin")
+                    scrambled.tofile(image_path)
+
+                    qualifier.rearrange_tiles_raw(
+                        image_path, scrambled.shape, scrambled.dtype, image.tile_size, image.ordering, out_path
+                    )
+                    user_output = np.fromfile(out_path, dtype=scrambled.dtype).reshape(scrambled.shape)
+
+                self.assertTrue((user_output == correct_output).all())
+
+    def test_raw_same_path_raises_exception(self):
+        """Rearranging raw pixel data onto itself should be refused rather than wipe the input."""
+        image = self.images[0]
+        scrambled = np.array(Image.open(image.scrambled_image_path))
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            image_path = os.path.join(out_dir, "scrambled.bin")
+            scrambled.tofile(image_path)
+
+            with self.assertRaises(ValueError):
+                qualifier.rearrange_tiles_raw(
+                    image_path, scrambled.shape, scrambled.dtype, image.tile_size, image.ordering, image_path
+                )
+            user_output = np.fromfile(image_path, dtype=scrambled.dtype).reshape(scrambled.shape)
+
+        self.assertTrue((user_output == scrambled).all())
+
+    def test_tile_rows_ordering(self):
+        """An ordering only moving whole rows of tiles around should be copied row by row, and correctly."""
+        image = self.images[1]
+        (img_height, img_width), (tile_height, tile_width) = image.image_size, image.tile_size
+        rows, cols = img_height // tile_height, img_width // tile_width
+        ordering = [row * cols + col for row in reversed(range(rows)) for col in range(cols)]
+
+        # One segment per pixel row
+        lut = qualifier._segment_lut(rows, cols, tile_height, np.asarray(ordering, dtype=np.intp))
+        self.assertEqual(img_height, lut.size)
+
+        scrambled = np.array(Image.open(image.scrambled_image_path))
+        correct_output = scrambled.reshape(rows, tile_height, *scrambled.shape[1:])[::-1].reshape(scrambled.shape)
+        with tempfile.TemporaryDirectory() as out_dir:
+            out_path = os.path.join(out_dir, "user_output.png")
+            qualifier.rearrange_tiles(image.scrambled_image_path, image.tile_size, ordering, out_path)
+            user_output = np.array(Image.open(out_path))
+
+        self.assertTrue((user_output == correct_output).all())
+
+    def test_rearranger_invalid_ordering_raises_exception(self):
+        """`TileRearranger` should reject bad orderings up front with the usual ValueError."""
+        test_cases = [
+            ((2, 2), (1, 1), [0.5, 1.5, 2.5, 3.5]),
+            ((2, 2), (1, 1), [0, 1, 2, 2**70]),
+            ((10, 10), (1, 1), list(range(99)) + [2**70]),
+        ]
+        for image_size, tile_size, ordering in test_cases:
+            with self.subTest(image_size=image_size, ordering=ordering[-1]):
+                with self.assertRaises(ValueError) as exc:
+                    qualifier.TileRearranger(tile_size, ordering, image_size)
+                self.assertEqual("The tile size or ordering are not valid for the given image", str(exc.exception))
+
+    def test_batch_correct_ordering(self):
+        """Unscramble the same image several times in one batch, every output should be the proper image."""
+        image = self.images[1]
+        with tempfile.TemporaryDirectory() as out_dir:
+            out_paths = [os.path.join(out_dir, f"user_output{i}.png") for i in range(4)]
+            qualifier.rearrange_tiles_batch(
+                [image.scrambled_image_path] * len(out_paths), image.image_size, image.tile_size, image.ordering,
+                out_paths
+            )
+
+            correct_output = np.array(Image.open(image.unscrambled_image_path))
+            for out_path in out_paths:
+                with self.subTest(out_path=out_path):
+                    user_output = np.array(Image.open(out_path))
+
+                    self.assertTrue((user_output == correct_output).all())
+
+    def test_batch_array_ordering(self):
+        """An ordering given as an integer array should work just like a list."""
+        image = self.images[1]
+        ordering = np.asarray(image.ordering, dtype=np.intp)
+        with tempfile.TemporaryDirectory() as out_dir:
+            out_paths = [os.path.join(out_dir, f"user_output{i}.png") for i in range(2)]
+            rearranger = qualifier.TileRearranger(image.tile_size, ordering, image.image_size)
+            rearranger(image.scrambled_image_path, out_paths[0])
+            qualifier.rearrange_tiles_batch(
+                [image.scrambled_image_path], image.image_size, image.tile_size, ordering, out_paths[1:]
+            )
+
+            correct_output = np.array(Image.open(image.unscrambled_image_path))
+            for out_path in out_paths:
+                with self.subTest(out_path=out_path):
+                    user_output = np.array(Image.open(out_path))
+
+                    self.assertTrue((user_output == correct_output).all())
+
 
 if __name__ == "__main__":
     unittest.main()